@@ -1,45 +1,110 @@
+import contextlib
+import os
+
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+import plotly.graph_objects as go
+
+EXCEL_PATH = "supermarket_sales.xlsx"
+# process_dataframe的输出（列或类型）有变化时递增版本号，旧版本写出的Parquet文件不再被读取
+PARQUET_SCHEMA_VERSION = 2
+PARQUET_PATH = f"supermarket_sales.v{PARQUET_SCHEMA_VERSION}.parquet"
+CATEGORY_COLUMNS = ["城市", "顾客类型", "性别", "产品类型"]
+
+
+def get_demo_dataframe():
+    # 无Excel文件时生成模拟数据，方便你测试
+    st.warning("未找到supermarket_sales.xlsx，使用模拟数据演示！")
+    data = {
+        "订单号": [1001, 1002, 1003, 1004, 1005, 1006],
+        "时间": ["09:30:00", "10:15:00", "11:20:00", "14:40:00", "15:10:00", "16:30:00"],
+        "城市": ["上海", "北京", "上海", "广州", "北京", "广州"],
+        "顾客类型": ["会员", "普通", "会员", "普通", "会员", "普通"],
+        "性别": ["女", "男", "男", "女", "女", "男"],
+        "产品类型": ["电子产品", "服装", "食品", "电子产品", "服装", "食品"],
+        "总价": [299, 199, 89, 399, 259, 129],
+        "评分": [4.5, 3.8, 4.2, 4.8, 3.9, 4.1]
+    }
+    return pd.DataFrame(data).set_index("订单号")
+
+
+def process_dataframe(df):
+    # 处理“时间”列：格式固定为HH:MM:SS，直接截取前两位得到小时，无需完整解析datetime
+    # （Excel中的时间单元格读出为datetime.time，先统一转成pandas的string类型；小时只有24种取值，用int8存储）
+    df["小时数"] = df["时间"].astype("string").str[:2].astype("int8")
+    # 筛选和分组用到的文本列转换为category类型，比较和groupby改为基于整数编码
+    for column in CATEGORY_COLUMNS:
+        df[column] = df[column].astype("category")
+    # 评分只用于求均值并保留1位小数，降为float32减少读取的数据量
+    # （总价是金额，保留float64，避免float32的表示误差出现在图表数据中）
+    df["评分"] = df["评分"].astype("float32")
+    return df
 
 
+# 缓存读取结果，避免每次控件交互重跑脚本时重新解析Excel
+# （函数内的st.warning会被缓存记录，命中缓存时自动重放）
+# 同时返回数据版本（数据源文件的修改时间，模拟数据为固定字符串），供下游缓存作为键
+@st.cache_data(show_spinner=False, ttl=3600)
 def get_dataframe_from_excel():
+    # 已有不早于Excel的当前版本Parquet文件时直接读取，跳过Excel解析和时间列处理
+    if os.path.exists(PARQUET_PATH) and (
+        not os.path.exists(EXCEL_PATH)
+        or os.path.getmtime(PARQUET_PATH) >= os.path.getmtime(EXCEL_PATH)
+    ):
+        try:
+            df = pd.read_parquet(PARQUET_PATH)
+        except (OSError, ValueError):
+            # 文件损坏（如写入中断）时忽略，改为从Excel重建
+            pass
+        else:
+            source_path = EXCEL_PATH if os.path.exists(EXCEL_PATH) else PARQUET_PATH
+            return df, os.path.getmtime(source_path)
+
     # 读取Excel文件数据（兼容无Excel文件的情况，增加异常处理）
     try:
         df = pd.read_excel(
-            'supermarket_sales.xlsx',
+            EXCEL_PATH,
             sheet_name="销售数据",
             skiprows=1,  # 跳过第1行（标题行）
             index_col="订单号",
-            engine='openpyxl'  # 显式指定引擎，避免依赖问题
+            # 只读取用到的列，其余单元格不解析
+            usecols=["订单号", "时间", "城市", "顾客类型", "性别", "产品类型", "总价", "评分"],
+            engine='calamine'  # Rust实现的解析引擎，比openpyxl快数倍（需pandas>=2.2）
         )
     except FileNotFoundError:
-        # 无Excel文件时生成模拟数据，方便你测试
-        st.warning("未找到supermarket_sales.xlsx，使用模拟数据演示！")
-        data = {
-            "订单号": [1001, 1002, 1003, 1004, 1005, 1006],
-            "时间": ["09:30:00", "10:15:00", "11:20:00", "14:40:00", "15:10:00", "16:30:00"],
-            "城市": ["上海", "北京", "上海", "广州", "北京", "广州"],
-            "顾客类型": ["会员", "普通", "会员", "普通", "会员", "普通"],
-            "性别": ["女", "男", "男", "女", "女", "男"],
-            "产品类型": ["电子产品", "服装", "食品", "电子产品", "服装", "食品"],
-            "总价": [299, 199, 89, 399, 259, 129],
-            "评分": [4.5, 3.8, 4.2, 4.8, 3.9, 4.1]
-        }
-        df = pd.DataFrame(data).set_index("订单号")
-    
-    # 处理“时间”列，转换为datetime并提取小时
-    df["小时数"] = pd.to_datetime(df["时间"], format="%H:%M:%S").dt.hour
-    return df
+        return process_dataframe(get_demo_dataframe()), "demo"
+
+    df = process_dataframe(df)
+    # 转存为Parquet，之后冷启动直接读取列式文件（目录不可写时跳过）
+    # 先写到同目录的临时文件再原子替换，写入中途失败（如磁盘已满）也不会留下残缺的Parquet文件
+    tmp_path = f"{PARQUET_PATH}.{os.getpid()}.tmp"
+    try:
+        df.to_parquet(tmp_path)
+        os.replace(tmp_path, PARQUET_PATH)
+    except (OSError, ValueError):
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+    return df, os.path.getmtime(EXCEL_PATH)
+
+
+def filter_dataframe(df, city, customer_type, gender):
+    # 三个筛选器都选中了全部取值时无需筛选，直接返回原数据
+    selections = {"城市": city, "顾客类型": customer_type, "性别": gender}
+    if all(len(values) == len(df[column].cat.categories) for column, values in selections.items()):
+        return df
+    # 用isin构造布尔掩码，避免df.query每次重新解析表达式字符串
+    mask = df["城市"].isin(city) & df["顾客类型"].isin(customer_type) & df["性别"].isin(gender)
+    return df.loc[mask]
 
 
 def add_sidebar_func(df):
     # 构建侧边栏筛选器
     with st.sidebar:
         st.subheader("请筛选数据：")
+        # 筛选项直接取category列已建好的类别索引，无需每次重跑都扫描全列求unique()
 
         # 城市筛选
-        city_unique = df["城市"].unique()
+        city_unique = df["城市"].cat.categories.tolist()
         city = st.multiselect(
             "请选择城市：",
             options=city_unique,
@@ -47,7 +112,7 @@ def add_sidebar_func(df):
         )
 
         # 顾客类型筛选
-        customer_type_unique = df["顾客类型"].unique()
+        customer_type_unique = df["顾客类型"].cat.categories.tolist()
         customer_type = st.multiselect(
             "请选择顾客类型：",
             options=customer_type_unique,
@@ -55,34 +120,56 @@ def add_sidebar_func(df):
         )
 
         # 性别筛选
-        gender_unique = df["性别"].unique()
+        gender_unique = df["性别"].cat.categories.tolist()
         gender = st.multiselect(
             "请选择性别：",
             options=gender_unique,
             default=gender_unique
         )
 
-        # 筛选数据
-        df_selection = df.query(
-            "城市 == @city & 顾客类型 == @customer_type & 性别 == @gender"
-        )
-        return df_selection
+        # 返回排序后的元组：可哈希，且与选择顺序无关，便于作为缓存键
+        return tuple(sorted(city)), tuple(sorted(customer_type)), tuple(sorted(gender))
 
 
-def product_line_chart(df):
-    # 按“产品类型”分组计算总销售额（折线图展示）
-    sales_by_product_line = df.groupby(by=["产品类型"])[["总价"]].sum().sort_values(by="总价")
-    # 生成折线图（产品类型）
-    fig_product_sales = px.line(
-        sales_by_product_line,
-        x=sales_by_product_line.index,
-        y="总价",
-        title="<b>按产品类型划分的销售额（折线图）</b>",
-        markers=True,  # 显示数据点标记
-        line_shape="linear"  # 线性折线
-    )
+# 关键指标和图表数据只取决于数据版本和筛选条件，按二者缓存；相同时直接返回缓存结果
+# （参数_df以下划线开头，Streamlit不会对整张表做哈希，数据是否变化由data_version区分）
+@st.cache_data(show_spinner=False, ttl=3600)
+def aggregate_sales(_df, data_version, city, customer_type, gender):
+    df_selection = filter_dataframe(_df, city, customer_type, gender)
+    # 一次agg同时算出总销售额、每单平均销售额和平均评分
+    stats = df_selection.agg({"总价": ["sum", "mean"], "评分": "mean"})
+    average_rating = round(float(stats.loc["mean", "评分"]), 1)
+    key_metrics = {
+        "total_sales": int(stats.loc["sum", "总价"]),
+        "average_rating": average_rating,
+        # 星级字符串随指标一起缓存，每种筛选条件只拼接一次
+        "star_rating_string": ":star:" * int(round(average_rating)),
+        "average_sale_by_transaction": round(float(stats.loc["mean", "总价"]), 2),
+    }
+    # observed=True跳过筛选后不存在的产品类型，sort=False省去分组排序（之后按销售额排序）
+    sales_by_product_line = df_selection.groupby("产品类型", observed=True, sort=False)["总价"].sum().sort_values()
+    # 小时折线图需要按小时升序连线，这里保留groupby默认的按键排序
+    sales_by_hour = df_selection.groupby("小时数")["总价"].sum()
+    return key_metrics, sales_by_product_line, sales_by_hour
+
+
+# 图表按汇总Series缓存：汇总结果只有几十行，哈希开销可忽略，筛选条件不变时直接复用已生成的图表
+# （用cache_resource直接返回同一个Figure对象；cache_data每次命中都要反序列化并重新校验构造Figure。
+# 图表返回后不再被修改，共享同一对象是安全的）
+@st.cache_resource(show_spinner=False, ttl=3600)
+def product_line_chart(sales_by_product_line):
+    # 传入已按“产品类型”汇总好的销售额Series，只负责生成折线图（产品类型）
+    # 汇总结果只有几行，直接用go.Scatter传入列表，跳过Plotly Express的列推断
+    fig_product_sales = go.Figure(go.Scatter(
+        x=sales_by_product_line.index.tolist(),
+        y=sales_by_product_line.values.tolist(),
+        mode="lines+markers",  # 显示数据点标记
+        line_shape="linear",  # 线性折线
+        hovertemplate="产品类型=%{x}<br>总价=%{y}<extra></extra>"
+    ))
     # 美化图表：调整字体和颜色
     fig_product_sales.update_layout(
+        title="<b>按产品类型划分的销售额（折线图）</b>",
         xaxis_title="产品类型",
         yaxis_title="销售额（RMB）",
         font=dict(family="SimHei", size=12)  # 支持中文显示
@@ -90,20 +177,20 @@ def product_line_chart(df):
     return fig_product_sales
 
 
-def hour_chart(df):
-    # 按“小时数”分组计算总销售额（折线图展示）
-    sales_by_hour = df.groupby(by=["小时数"])[["总价"]].sum().reset_index()
-    # 生成折线图（小时销售额，时间趋势更直观）
-    fig_hour_sales = px.line(
-        sales_by_hour,
-        x="小时数",
-        y="总价",
-        title="<b>按小时数划分的销售额（折线图）</b>",
-        markers=True,  # 显示数据点标记
-        line_shape="spline"  # 平滑折线，更美观
-    )
+# 与产品类型图表相同，按汇总Series缓存
+@st.cache_resource(show_spinner=False, ttl=3600)
+def hour_chart(sales_by_hour):
+    # 传入已按“小时数”汇总好的销售额Series，生成折线图（小时销售额，时间趋势更直观）
+    fig_hour_sales = go.Figure(go.Scatter(
+        x=sales_by_hour.index.tolist(),
+        y=sales_by_hour.values.tolist(),
+        mode="lines+markers",  # 显示数据点标记
+        line_shape="spline",  # 平滑折线，更美观
+        hovertemplate="小时数=%{x}<br>总价=%{y}<extra></extra>"
+    ))
     # 美化图表：调整字体和颜色
     fig_hour_sales.update_layout(
+        title="<b>按小时数划分的销售额（折线图）</b>",
         xaxis_title="小时数（24小时制）",
         yaxis_title="销售额（RMB）",
         font=dict(family="SimHei", size=12)  # 支持中文显示
@@ -111,7 +198,7 @@ def hour_chart(df):
     return fig_hour_sales
 
 
-def main_page_demo(df):
+def main_page_demo(df, data_version, selection):
     # 设置页面标题和布局
     st.title("📊 销售仪表板（折线图版）")
     st.markdown("---")
@@ -119,11 +206,12 @@ def main_page_demo(df):
     # 构建信息区（3个容器）
     left_key_col, middle_key_col, right_key_col = st.columns(3)
 
-    # 计算关键指标
-    total_sales = int(df["总价"].sum())
-    average_rating = round(df["评分"].mean(), 1)
-    star_rating_string = ":star:" * int(round(average_rating, 0))
-    average_sale_by_transaction = round(df["总价"].mean(), 2)
+    # 计算关键指标和图表数据（按筛选条件缓存），图表函数只负责绘图
+    key_metrics, sales_by_product_line, sales_by_hour = aggregate_sales(df, data_version, *selection)
+    total_sales = key_metrics["total_sales"]
+    average_rating = key_metrics["average_rating"]
+    star_rating_string = key_metrics["star_rating_string"]
+    average_sale_by_transaction = key_metrics["average_sale_by_transaction"]
 
     # 左侧：总销售额
     with left_key_col:
@@ -148,13 +236,13 @@ def main_page_demo(df):
 
     # 左侧：小时销售额折线图
     with left_chart_col:
-        hour_fig = hour_chart(df)
-        st.plotly_chart(hour_fig, use_container_width=True)
+        hour_fig = hour_chart(sales_by_hour)
+        st.plotly_chart(hour_fig, width="stretch")
 
     # 右侧：产品类型销售额折线图
     with right_chart_col:
-        product_fig = product_line_chart(df)
-        st.plotly_chart(product_fig, use_container_width=True)
+        product_fig = product_line_chart(sales_by_product_line)
+        st.plotly_chart(product_fig, width="stretch")
 
 
 def run_app():
@@ -165,11 +253,11 @@ def run_app():
         layout="wide"
     )
     # 获取数据（增加异常处理，避免文件缺失报错）
-    sale_df = get_dataframe_from_excel()
+    sale_df, data_version = get_dataframe_from_excel()
     # 侧边栏筛选
-    df_selection = add_sidebar_func(sale_df)
+    selection = add_sidebar_func(sale_df)
     # 渲染主页面
-    main_page_demo(df_selection)
+    main_page_demo(sale_df, data_version, selection)
 
 
 if __name__ == "__main__":